@@ -5,17 +5,38 @@ Generates historical probability data from nflverse for the NFL Live Game Simula
 """
 
 import json
+import os
+import time
 from datetime import datetime
 import sys
 
 try:
     import nfl_data_py as nfl
-    import pandas as pd
+    import polars as pl
 except ImportError:
     print("Error: Required packages not installed")
-    print("Please run: pip install nfl_data_py pandas")
+    print("Please run: pip install nfl_data_py 'polars>=2.0' pyarrow")
     sys.exit(1)
 
+# Optional: faster JSON encoding, falls back to the standard library
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Downloaded seasons are cached locally and refreshed once a day
+CACHE_DIR = os.path.expanduser('~/.cache/nflverse')
+CACHE_MAX_AGE = 24 * 60 * 60
+
+# The only play-by-play columns the calculations read (nflverse ships ~400)
+PBP_COLUMNS = [
+    'play_id', 'play_type', 'down', 'ydstogo', 'yardline_100',
+    'first_down', 'first_down_converted', 'touchdown', 'posteam',
+    'complete_pass', 'pass_length',
+    'receiver_player_id', 'receiver_player_name',
+    'rusher_player_id', 'rusher_player_name'
+]
+
 
 def main():
     """Main function to generate probability data"""
@@ -39,20 +60,25 @@ def main():
     print("Calculating probabilities...")
     print()
 
-    print("  [1/4] League-wide conversion rates...")
-    league_rates = calculate_league_rates(pbp)
-    print(f"      ✓ Generated {len(league_rates)} league conversion rates")
+    # Every calculation below only looks at 3rd and 4th downs
+    third_fourth = pbp.lazy().filter(pl.col('down') >= 3)
 
-    print("  [2/4] Team-specific conversion rates...")
-    team_rates = calculate_team_rates(pbp)
-    print(f"      ✓ Generated {len(team_rates)} team-specific rates")
+    league_query = calculate_league_rates(third_fourth)
+    team_query = calculate_team_rates(third_fourth)
+    field_query = calculate_field_position_impact(third_fourth)
+    player_query = calculate_player_rates(third_fourth)
 
-    print("  [3/4] Field position impact...")
-    field_position = calculate_field_position_impact(pbp)
-    print(f"      ✓ Generated {len(field_position)} field position rates")
+    # Run all four queries together so polars shares the scan and filters and
+    # executes them in parallel on its own thread pool
+    print("  Running aggregations...")
+    league_rates, team_rates, field_position, player_rates = [
+        frame.to_dicts() for frame in
+        pl.collect_all([league_query, team_query, field_query, player_query])
+    ]
 
-    print("  [4/4] Player success rates...")
-    player_rates = calculate_player_rates(pbp)
+    print(f"      ✓ Generated {len(league_rates)} league conversion rates")
+    print(f"      ✓ Generated {len(team_rates)} team-specific rates")
+    print(f"      ✓ Generated {len(field_position)} field position rates")
     print(f"      ✓ Generated {len(player_rates)} player success rates")
 
     print()
@@ -77,8 +103,12 @@ def main():
     output_path = '../probability-data.json'
     print(f"Saving to {output_path}...")
 
-    with open(output_path, 'w') as f:
-        json.dump(output, f, indent=2)
+    if orjson is not None:
+        with open(output_path, 'wb') as f:
+            f.write(orjson.dumps(output, option=orjson.OPT_INDENT_2))
+    else:
+        with open(output_path, 'w') as f:
+            json.dump(output, f, indent=2)
 
     print(f"✓ Saved probability data successfully")
     print()
@@ -101,27 +131,58 @@ def load_play_by_play_data():
     try:
         # Try current season first (2025)
         try:
-            pbp_2025 = nfl.import_pbp_data([2025])
+            pbp_2025 = fetch_season_data(2025)
             current_season = 2025
             pbp = pbp_2025
             print(f"  Using 2025 season data")
         except:
             print("  2025 data not available, using 2024")
-            pbp_2024 = nfl.import_pbp_data([2024])
+            pbp_2024 = fetch_season_data(2024)
             current_season = 2024
             pbp = pbp_2024
 
         # Filter to relevant plays
-        pbp = pbp[pbp['play_type'].isin(['pass', 'run'])].copy()
-        pbp = pbp[pbp['down'].isin([1, 2, 3, 4])].copy()
+        pbp = pbp.lazy().filter(
+            pl.col('play_type').is_in(['pass', 'run']) &
+            pl.col('down').is_between(1, 4)
+        ).collect()
 
         # Handle missing first_down_converted column
         if 'first_down_converted' not in pbp.columns:
             # Create it based on other columns
-            pbp['first_down_converted'] = (
-                (pbp['first_down'] == 1) |
-                (pbp['touchdown'] == 1)
-            ).astype(int)
+            pbp = pbp.with_columns(
+                ((pl.col('first_down') == 1) | (pl.col('touchdown') == 1))
+                .fill_null(False)
+                .cast(pl.Int8)
+                .alias('first_down_converted')
+            )
+
+        # Shrink the columns the aggregations scan: 0/1 flags and downs fit in int8
+        pbp = pbp.with_columns(
+            [pl.col('down').cast(pl.Int8)] +
+            [
+                pl.col(c).cast(pl.Int8)
+                for c in ['first_down_converted', 'touchdown', 'complete_pass']
+                if c in pbp.columns
+            ]
+        )
+
+        # Group keys as categoricals so group_by hashes integer codes, not strings
+        pbp = pbp.with_columns([
+            pl.col(c).cast(pl.Categorical)
+            for c in ['play_type', 'posteam', 'receiver_player_id', 'rusher_player_id']
+            if c in pbp.columns
+        ])
+
+        # Bucket distance and field position (missing values fall in 'medium' / 'mid_field')
+        pbp = pbp.with_columns([
+            pl.col('ydstogo').fill_null(4)
+            .bin_intervals([3, 6, 10], labels=['short', 'medium', 'long', 'very_long'], right_closed=True)
+            .alias('dist_bucket'),
+            pl.col('yardline_100').fill_null(50)
+            .bin_intervals([10, 20, 50], labels=['red_zone', 'green_zone', 'mid_field', 'own_territory'], right_closed=True)
+            .alias('field_zone')
+        ])
 
         return pbp, current_season
 
@@ -130,169 +191,175 @@ def load_play_by_play_data():
         return None, None
 
 
-def calculate_league_rates(pbp):
-    """Calculate league-wide conversion rates by down, distance, and play type"""
+def fetch_season_data(season):
+    """Load one season of play-by-play data, reusing the parquet cache when fresh"""
+    cache_path = os.path.join(CACHE_DIR, f'pbp_{season}.parquet')
 
-    def distance_bucket(yards):
-        if pd.isna(yards):
-            return 'medium'
-        if yards <= 3:
-            return 'short'
-        elif yards <= 6:
-            return 'medium'
-        elif yards <= 10:
-            return 'long'
-        else:
-            return 'very_long'
+    if os.path.exists(cache_path) and time.time() - os.path.getmtime(cache_path) < CACHE_MAX_AGE:
+        print(f"  Using cached data from {cache_path}")
+        cached = pl.scan_parquet(cache_path)
+        columns = cached.collect_schema().names()
+        return cached.select([c for c in PBP_COLUMNS if c in columns]).collect()
 
-    pbp['dist_bucket'] = pbp['ydstogo'].apply(distance_bucket)
+    pbp = nfl.import_pbp_data([season])
+    pbp = pl.from_pandas(pbp[[c for c in PBP_COLUMNS if c in pbp.columns]])
 
-    # Focus on 3rd and 4th downs
-    third_fourth = pbp[pbp['down'].isin([3, 4])].copy()
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        pbp.write_parquet(cache_path, compression='zstd')
+    except OSError as e:
+        print(f"  Warning: could not cache data: {e}")
 
-    rates = third_fourth.groupby(['down', 'dist_bucket', 'play_type']).agg({
-        'first_down_converted': 'mean',
-        'play_id': 'count'
-    }).reset_index()
+    return pbp
 
-    rates.columns = ['down', 'distance', 'play_type', 'success_rate', 'sample_size']
 
-    # Filter out small sample sizes
-    rates = rates[rates['sample_size'] >= 10]
+def calculate_league_rates(third_fourth):
+    """Calculate league-wide conversion rates by down, distance, and play type"""
 
-    return rates.to_dict('records')
+    rates = third_fourth.group_by([
+        pl.col('down'),
+        pl.col('dist_bucket').alias('distance'),
+        pl.col('play_type')
+    ]).agg([
+        pl.col('first_down_converted').mean().alias('success_rate'),
+        pl.len().alias('sample_size')
+    ]).sort(['down', 'distance', 'play_type'])
 
+    # Filter out small sample sizes
+    rates = rates.filter(pl.col('sample_size') >= 10)
 
-def calculate_team_rates(pbp):
-    """Calculate team-specific conversion rates"""
+    return rates
 
-    def distance_bucket(yards):
-        if pd.isna(yards):
-            return 'medium'
-        if yards <= 3:
-            return 'short'
-        elif yards <= 6:
-            return 'medium'
-        elif yards <= 10:
-            return 'long'
-        else:
-            return 'very_long'
 
-    pbp['dist_bucket'] = pbp['ydstogo'].apply(distance_bucket)
+def calculate_team_rates(third_fourth):
+    """Calculate team-specific conversion rates"""
 
     # Only 3rd downs
-    third_downs = pbp[pbp['down'] == 3].copy()
+    third_downs = third_fourth.filter(pl.col('down') == 3)
 
-    rates = third_downs.groupby(['posteam', 'dist_bucket', 'play_type']).agg({
-        'first_down_converted': 'mean',
-        'play_id': 'count'
-    }).reset_index()
-
-    rates.columns = ['team', 'distance', 'play_type', 'success_rate', 'sample_size']
+    rates = third_downs.group_by([
+        pl.col('posteam').alias('team'),
+        pl.col('dist_bucket').alias('distance'),
+        pl.col('play_type')
+    ]).agg([
+        pl.col('first_down_converted').mean().alias('success_rate'),
+        pl.len().alias('sample_size')
+    ]).sort(['team', 'distance', 'play_type'])
 
     # Filter small samples
-    rates = rates[rates['sample_size'] >= 5]
+    rates = rates.filter(pl.col('sample_size') >= 5)
 
     # Remove null teams
-    rates = rates[rates['team'].notna()]
+    rates = rates.filter(pl.col('team').is_not_null())
 
-    return rates.to_dict('records')
+    return rates
 
 
-def calculate_field_position_impact(pbp):
+def calculate_field_position_impact(third_fourth):
     """Calculate how field position affects success rates"""
 
-    def field_zone(yardline_100):
-        if pd.isna(yardline_100):
-            return 'mid_field'
-        if yardline_100 <= 10:
-            return 'red_zone'
-        elif yardline_100 <= 20:
-            return 'green_zone'
-        elif yardline_100 <= 50:
-            return 'mid_field'
-        else:
-            return 'own_territory'
-
-    pbp['field_zone'] = pbp['yardline_100'].apply(field_zone)
-
-    third_downs = pbp[pbp['down'] == 3].copy()
+    third_downs = third_fourth.filter(pl.col('down') == 3)
 
     # Check if touchdown column exists
-    if 'touchdown' not in third_downs.columns:
-        third_downs['touchdown'] = 0
+    if 'touchdown' not in third_downs.collect_schema().names():
+        third_downs = third_downs.with_columns(pl.lit(0).alias('touchdown'))
 
-    rates = third_downs.groupby(['field_zone', 'play_type']).agg({
-        'first_down_converted': 'mean',
-        'touchdown': 'mean',
-        'play_id': 'count'
-    }).reset_index()
+    rates = third_downs.group_by([
+        pl.col('field_zone').alias('zone'),
+        pl.col('play_type')
+    ]).agg([
+        pl.col('first_down_converted').mean().alias('conversion_rate'),
+        pl.col('touchdown').mean().alias('td_rate'),
+        pl.len().alias('sample_size')
+    ]).sort(['zone', 'play_type'])
 
-    rates.columns = ['zone', 'play_type', 'conversion_rate', 'td_rate', 'sample_size']
+    return rates
 
-    return rates.to_dict('records')
 
-
-def calculate_player_rates(pbp):
+def calculate_player_rates(third_fourth):
     """Calculate success rates for top players"""
 
+    columns = third_fourth.collect_schema().names()
+
     # For receivers: targets on 3rd down
-    third_down_passes = pbp[(pbp['down'] == 3) & (pbp['play_type'] == 'pass')].copy()
+    third_down_passes = third_fourth.filter((pl.col('down') == 3) & (pl.col('play_type') == 'pass'))
 
     # Check if required columns exist
-    if 'receiver_player_id' not in third_down_passes.columns:
+    if 'receiver_player_id' not in columns:
         print("    Warning: receiver_player_id column not found, skipping player stats")
-        return []
+        return pl.LazyFrame(schema={
+            'player_id': pl.Utf8,
+            'player_name': pl.Utf8,
+            'position': pl.Utf8,
+            'conversion_rate': pl.Float64
+        })
 
     # Check if complete_pass column exists
-    if 'complete_pass' not in third_down_passes.columns:
-        third_down_passes['complete_pass'] = (third_down_passes['pass_length'].notna()).astype(int)
-
-    receiver_stats = third_down_passes.groupby('receiver_player_id').agg({
-        'receiver_player_name': 'first',
-        'complete_pass': 'mean',
-        'first_down_converted': 'mean',
-        'play_id': 'count'
-    }).reset_index()
+    if 'complete_pass' not in columns:
+        third_down_passes = third_down_passes.with_columns(
+            pl.col('pass_length').is_not_null().cast(pl.Int8).alias('complete_pass')
+        )
 
-    receiver_stats.columns = ['player_id', 'player_name', 'catch_rate', 'conversion_rate', 'targets']
+    receiver_stats = third_down_passes.group_by(pl.col('receiver_player_id').alias('player_id')).agg([
+        pl.col('complete_pass').mean().alias('catch_rate'),
+        pl.col('first_down_converted').mean().alias('conversion_rate'),
+        pl.len().alias('targets')
+    ])
 
     # Only players with 10+ targets
-    receiver_stats = receiver_stats[receiver_stats['targets'] >= 10]
+    receiver_stats = receiver_stats.filter(pl.col('targets') >= 10)
+
+    # Attach names with a join instead of carrying strings through the group_by
+    # First non-null name per player, matching pandas' 'first' aggregation
+    receiver_names = third_down_passes.filter(
+        pl.col('receiver_player_name').is_not_null()
+    ).unique('receiver_player_id', keep='first').select([
+        pl.col('receiver_player_id').alias('player_id'),
+        pl.col('receiver_player_name').alias('player_name')
+    ])
+    receiver_stats = receiver_stats.join(receiver_names, on='player_id', how='left')
 
     # Remove null players
-    receiver_stats = receiver_stats[receiver_stats['player_id'].notna()]
-    receiver_stats = receiver_stats[receiver_stats['player_name'].notna()]
+    receiver_stats = receiver_stats.filter(
+        pl.col('player_id').is_not_null() & pl.col('player_name').is_not_null()
+    )
 
-    # Sort by conversion rate, take top 50
-    receiver_stats = receiver_stats.sort_values('conversion_rate', ascending=False).head(50)
+    # Take top 50 by conversion rate (partial sort), then order just those
+    receiver_stats = receiver_stats.top_k(50, by='conversion_rate').sort('conversion_rate', descending=True)
 
     # For rushers: carries on 3rd down
-    third_down_runs = pbp[(pbp['down'] == 3) & (pbp['play_type'] == 'run')].copy()
+    third_down_runs = third_fourth.filter((pl.col('down') == 3) & (pl.col('play_type') == 'run'))
 
     rusher_data = []
-    if 'rusher_player_id' in third_down_runs.columns:
-        rusher_stats = third_down_runs.groupby('rusher_player_id').agg({
-            'rusher_player_name': 'first',
-            'first_down_converted': 'mean',
-            'play_id': 'count'
-        }).reset_index()
-
-        rusher_stats.columns = ['player_id', 'player_name', 'conversion_rate', 'carries']
-
-        rusher_stats = rusher_stats[rusher_stats['carries'] >= 10]
-        rusher_stats = rusher_stats[rusher_stats['player_id'].notna()]
-        rusher_stats = rusher_stats[rusher_stats['player_name'].notna()]
-        rusher_stats = rusher_stats.sort_values('conversion_rate', ascending=False).head(50)
-
-        rusher_stats['position'] = 'RB'
-        rusher_data = rusher_stats[['player_id', 'player_name', 'position', 'conversion_rate']].to_dict('records')
+    if 'rusher_player_id' in columns:
+        rusher_stats = third_down_runs.group_by(pl.col('rusher_player_id').alias('player_id')).agg([
+            pl.col('first_down_converted').mean().alias('conversion_rate'),
+            pl.len().alias('carries')
+        ])
+
+        rusher_stats = rusher_stats.filter(pl.col('carries') >= 10)
+
+        rusher_names = third_down_runs.filter(
+            pl.col('rusher_player_name').is_not_null()
+        ).unique('rusher_player_id', keep='first').select([
+            pl.col('rusher_player_id').alias('player_id'),
+            pl.col('rusher_player_name').alias('player_name')
+        ])
+        rusher_stats = rusher_stats.join(rusher_names, on='player_id', how='left')
+
+        rusher_stats = rusher_stats.filter(
+            pl.col('player_id').is_not_null() & pl.col('player_name').is_not_null()
+        )
+        rusher_stats = rusher_stats.top_k(50, by='conversion_rate').sort('conversion_rate', descending=True)
+
+        rusher_stats = rusher_stats.with_columns(pl.lit('RB').alias('position'))
+        rusher_data = [rusher_stats.select(['player_id', 'player_name', 'position', 'conversion_rate'])]
 
     # Combine
-    receiver_stats['position'] = 'WR'
-    receiver_data = receiver_stats[['player_id', 'player_name', 'position', 'conversion_rate']].to_dict('records')
+    receiver_stats = receiver_stats.with_columns(pl.lit('WR').alias('position'))
+    receiver_data = [receiver_stats.select(['player_id', 'player_name', 'position', 'conversion_rate'])]
 
-    return receiver_data + rusher_data
+    return pl.concat(receiver_data + rusher_data)
 
 
 if __name__ == '__main__':
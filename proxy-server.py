@@ -4,74 +4,110 @@ Simple CORS proxy server for ESPN API
 Runs on localhost:8001
 """
 
-from http.server import HTTPServer, BaseHTTPRequestHandler
-import urllib.request
 import urllib.parse
-import json
 import sys
+import time
 
-class CORSProxyHandler(BaseHTTPRequestHandler):
-    def _set_cors_headers(self):
-        """Set CORS headers for all responses"""
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', '*')
-        self.send_header('Access-Control-Max-Age', '3600')
-
-    def do_GET(self):
-        # Extract ESPN URL from query parameter
-        if '?url=' in self.path:
-            encoded_url = self.path.split('?url=', 1)[1]
-            espn_url = urllib.parse.unquote(encoded_url)
-
-            try:
-                # Fetch from ESPN
-                print(f"Proxying request to: {espn_url}")
-
-                req = urllib.request.Request(
-                    espn_url,
-                    headers={'User-Agent': 'Mozilla/5.0'}
-                )
-
-                with urllib.request.urlopen(req) as response:
-                    data = response.read()
-
-                    # Send response with CORS headers FIRST
-                    self.send_response(200)
-                    self._set_cors_headers()
-                    self.send_header('Content-Type', 'application/json')
-                    self.end_headers()
-
-                    self.wfile.write(data)
-                    print(f"✓ Successfully proxied {len(data)} bytes")
-
-            except Exception as e:
-                print(f"✗ Error proxying request: {e}")
-                self.send_response(500)
-                self._set_cors_headers()
-                self.send_header('Content-Type', 'text/plain')
-                self.end_headers()
-                self.wfile.write(f"Proxy error: {str(e)}".encode())
-        else:
-            self.send_response(400)
-            self._set_cors_headers()
-            self.send_header('Content-Type', 'text/plain')
-            self.end_headers()
-            self.wfile.write(b"Missing 'url' parameter")
-
-    def do_OPTIONS(self):
-        # Handle preflight CORS requests
-        self.send_response(200)
-        self._set_cors_headers()
-        self.end_headers()
-
-    def log_message(self, format, *args):
-        # Suppress default logging (we'll do our own)
-        pass
+try:
+    import aiohttp
+    from aiohttp import web
+except ImportError:
+    print("Error: Required packages not installed")
+    print("Please run: pip install aiohttp")
+    sys.exit(1)
+
+# ESPN responses are reused for CACHE_TTL seconds and dropped after CACHE_MAX_AGE
+CACHE_TTL = 5.0
+CACHE_MAX_AGE = 60.0
+
+CORS_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+    'Access-Control-Allow-Headers': '*',
+    'Access-Control-Max-Age': '3600'
+}
+
+# Shared client session so ESPN connections are kept alive and reused
+SESSION = web.AppKey('session', aiohttp.ClientSession)
+
+# url -> (fetched_at, body, content_type)
+_cache = {}
+
+def get_cached(url):
+    """Return a fresh cached (body, content_type) for url, evicting stale entries"""
+    now = time.time()
+    for key, (fetched_at, _, _) in list(_cache.items()):
+        if now - fetched_at > CACHE_MAX_AGE:
+            del _cache[key]
+
+    fetched_at, body, content_type = _cache.get(url, (0, None, None))
+    if body is not None and now - fetched_at < CACHE_TTL:
+        return body, content_type
+    return None
+
+def store_cached(url, body, content_type):
+    """Remember a fetched response body"""
+    _cache[url] = (time.time(), body, content_type)
+
+async def client_session(app):
+    """Open the ESPN client session for the lifetime of the app"""
+    async with aiohttp.ClientSession(
+        headers={'User-Agent': 'Mozilla/5.0'},
+        timeout=aiohttp.ClientTimeout(total=10),
+        raise_for_status=True
+    ) as session:
+        app[SESSION] = session
+        yield
+
+async def proxy(request):
+    # Extract ESPN URL from query parameter
+    if '?url=' not in request.raw_path:
+        return web.Response(
+            status=400,
+            text="Missing 'url' parameter",
+            headers=CORS_HEADERS
+        )
+
+    encoded_url = request.raw_path.split('?url=', 1)[1]
+    espn_url = urllib.parse.unquote(encoded_url)
+
+    cached = get_cached(espn_url)
+    if cached is not None:
+        data, content_type = cached
+        print(f"✓ Served {len(data)} bytes from cache")
+        return web.Response(body=data, headers={**CORS_HEADERS, 'Content-Type': content_type})
+
+    try:
+        # Fetch from ESPN
+        print(f"Proxying request to: {espn_url}")
+
+        # aiohttp asks for gzip and decompresses the body itself
+        async with request.app[SESSION].get(espn_url) as response:
+            data = await response.read()
+            content_type = response.headers.get('Content-Type', 'application/json')
+
+        store_cached(espn_url, data, content_type)
+
+        print(f"✓ Successfully proxied {len(data)} bytes")
+        return web.Response(body=data, headers={**CORS_HEADERS, 'Content-Type': content_type})
+
+    except Exception as e:
+        print(f"✗ Error proxying request: {e}")
+        return web.Response(
+            status=500,
+            text=f"Proxy error: {str(e)}",
+            headers=CORS_HEADERS
+        )
+
+async def preflight(request):
+    # Handle preflight CORS requests
+    return web.Response(headers=CORS_HEADERS)
 
 def run_server(port=8001):
-    server_address = ('', port)
-    httpd = HTTPServer(server_address, CORSProxyHandler)
+    app = web.Application()
+    app.cleanup_ctx.append(client_session)
+    app.router.add_route('GET', '/{tail:.*}', proxy)
+    app.router.add_route('OPTIONS', '/{tail:.*}', preflight)
 
     print("=" * 60)
     print("NFL API Proxy Server")
@@ -84,11 +120,9 @@ def run_server(port=8001):
     print("=" * 60)
     print()
 
-    try:
-        httpd.serve_forever()
-    except KeyboardInterrupt:
-        print("\n\n✓ Server stopped.")
-        sys.exit(0)
+    # run_app handles Ctrl+C itself and closes the client session on the way out
+    web.run_app(app, port=port, print=None, access_log=None)
+    print("\n\n✓ Server stopped.")
 
 if __name__ == '__main__':
     run_server()